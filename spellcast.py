@@ -8,34 +8,84 @@ to check texts with a compiler styled command-line user interface.
 """
 
 import sys
-# import os
+import os
+import io
 import re
-import textwrap
-import argparse
 import subprocess
 import json
 import bisect
+import itertools
+import threading
+import contextlib
+from collections import defaultdict, deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 ## General comments on backends:
-## A backend function should return multiple objects via 'yield'.
-## Each object must be one 'mistake' and should have the following fields:
-##   - 'word' a string containing the wrong word
-##   - 'line' the line in the input file
-##   - 'offset' the position of the word in the line
-##   - 'suggestions' a list of strings containing suggestions
+## A backend is a class whose constructor takes the list of backend options
+## and whether suggestions are needed at all ('suggest').
+## Its objects are context managers (such that a backend may keep a spell
+## checker process running across multiple files) and provide a method
+## 'check(lines)' that should return multiple objects via 'yield'.
+## Each object must be one Mistake. Before the lines of another file are
+## checked, 'start_file()' is called, such that no state of the previous
+## file carries over.
+
+class BackendError(Exception):
+    """the spell checker of a backend failed"""
+
+
+class Mistake:
+    """
+    A spelling mistake, with the attributes:
+      - 'word' a string containing the wrong word
+      - 'offset' the position of the word in the line
+      - 'suggestions' a list of strings containing suggestions
+      - 'line' the line in the input file
+    """
+    # there may be many mistakes, so avoid a __dict__ per object
+    __slots__ = ('word', 'offset', 'suggestions', 'line')
+
+    def __init__(self, word, offset, suggestions, line=None):
+        self.word = word
+        self.offset = offset
+        self.suggestions = suggestions
+        self.line = line
+
 
 ## Backend: Aspell
+# the maximum number of suggestions shown per mistake
+MAX_SUGGESTIONS = 10
+# matches a letter of any alphabet
+LETTER_RE = re.compile(r'[^\W\d_]')
+# aspell options selecting a filter mode (tex, html, email, nroff, markdown)
+ASPELL_FILTER_FLAGS = ('-t', '-H', '-e', '-n', '-M')
+# the filter modes that do not keep any state across lines
+ASPELL_STATELESS_MODES = ('none', 'url')
+
+
+def aspell_uses_filter(aspell_options):
+    """whether the given aspell options enable a filter, like the
+    one for TeX or HTML. Such filters keep state from one line to the next.
+    """
+    for o in aspell_options:
+        if o in ASPELL_FILTER_FLAGS or o.startswith(('--add-filter', '--filter')):
+            return True
+        # a plain '--mode' takes the mode from the next argument
+        if o.startswith('--mode') and o.partition('=')[2] not in ASPELL_STATELESS_MODES:
+            return True
+    return False
+
+
 def parse_aspell_line_with_suggestions(line):
     """parse a &-line of aspell, including the &-prefix
 
     & WRONGWORD SUGGESTION_COUNT WORD_OFFSET_IN_LINE: SUGESSTIONS, ...
     """
-    metadata = line.split(':')[0].split(' ')
-    return {
-        'word': metadata[1],
-        'offset': int(metadata[3]) - 1, # subtract one for the prefixing '^'
-        'suggestions': line.split(': ')[1].split(', ')
-    }
+    head, _, tail = line.partition(': ')
+    _, word, _, offset = head.split(' ', 3)
+    return Mistake(word,
+                   int(offset) - 1, # subtract one for the prefixing '^'
+                   tail.split(', ', MAX_SUGGESTIONS)[:MAX_SUGGESTIONS])
 
 def parse_aspell_line_no_suggestion(line):
     """parse a #-line of aspell, including the #-prefix
@@ -43,32 +93,34 @@ def parse_aspell_line_no_suggestion(line):
     & WRONGWORD WORD_OFFSET_IN_LINE
     """
     metadata = line.split(' ')
-    return {
-        'word': metadata[1],
-        'offset': int(metadata[2]) - 1, # subtract one for the prefixing '^'
-        'suggestions': []
-    }
-
-
-def aspell_report_file(lines, aspell_options):
-    """
-    Given the lines of a file, return a dict with spell checking
-    results and suggestions
+    return Mistake(metadata[1],
+                   int(metadata[2]) - 1, # subtract one for the prefixing '^'
+                   [])
+
+
+def _aspell_feed(stdin, lines):
+    """write the given lines to aspell's stdin"""
+    # the '^' prefix tells aspell to treat the line as text, not a command.
+    # The generator avoids building a second copy of the whole input.
+    try:
+        stdin.writelines('^' + l + '\n' for l in lines)
+        stdin.flush()
+    except BrokenPipeError:
+        # aspell was stopped, see AspellSession.__exit__()
+        pass
+
+
+def aspell_parse_reports(stream):
+    """parse the output of 'aspell -a' and yield the list of mistakes
+    of each input line. The mistakes do not have the 'line' field set.
     """
-    # see http://aspell.net/man-html/Through-A-Pipe.html
-    aspell_full_command = ['aspell', '-a'] + aspell_options
-    #print(aspell_full_command)
-    proc = subprocess.Popen(aspell_full_command,
-                            stdin=subprocess.PIPE,
-                            stdout=subprocess.PIPE,
-                            text=True)
-
-    out, _ = proc.communicate(input='\n'.join(['^' + l for l in lines]))
-    aspell_lines = out.splitlines()
-    line_number = 0
-    for aspell_report in aspell_lines:
+    mistakes = []
+    for aspell_report in stream:
+        aspell_report = aspell_report.rstrip('\n')
         if aspell_report == '':
-            line_number += 1
+            # aspell terminates the report of each line by an empty line
+            yield mistakes
+            mistakes = []
             continue
         if aspell_report[0] in ('*', '@'):
             continue
@@ -76,13 +128,153 @@ def aspell_report_file(lines, aspell_options):
             # TODO: what to do here?
             continue
         if aspell_report[0] == '#':
-            mistake = parse_aspell_line_no_suggestion(aspell_report)
-            mistake['line'] = line_number
-            yield mistake
+            mistakes.append(parse_aspell_line_no_suggestion(aspell_report))
         if aspell_report[0] == '&':
-            mistake = parse_aspell_line_with_suggestions(aspell_report)
-            mistake['line'] = line_number
-            yield mistake
+            mistakes.append(parse_aspell_line_with_suggestions(aspell_report))
+
+
+class AspellSession:
+    """
+    A running 'aspell -a' process that checks the lines of
+    possibly many files, such that aspell's startup and dictionary
+    loading happens only once.
+    """
+    # the maximum number of distinct lines whose mistakes are remembered
+    CACHE_SIZE = 65536
+
+    def __init__(self, aspell_options, suggest=True):
+        self.aspell_options = aspell_options
+        self.suggest = suggest
+        if not any(o.startswith('--sug-mode') for o in aspell_options):
+            # computing suggestions is the most expensive part of aspell,
+            # so use its cheapest mode if they are not shown anyway and
+            # a fast one otherwise
+            sug_mode = 'fast' if suggest else 'ultra'
+            self.aspell_options = aspell_options + [f'--sug-mode={sug_mode}']
+        # whether the result of a line may depend on the lines before it
+        self.filter_mode = aspell_uses_filter(aspell_options)
+        self.proc = None
+        # whether aspell has seen any lines since it was started
+        self.dirty = False
+        # the mistakes of the most recently checked lines, shared across
+        # files. The least recently used lines are dropped first.
+        self.cache = OrderedDict()
+
+    def _start(self):
+        # see http://aspell.net/man-html/Through-A-Pipe.html
+        aspell_full_command = ['aspell', '-a'] + self.aspell_options
+        #print(aspell_full_command)
+        self.proc = subprocess.Popen(aspell_full_command,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     text=True)
+        # discard the version banner
+        self.proc.stdout.readline()
+        # terse mode: do not report correctly spelled words
+        self.proc.stdin.write('!\n')
+        self.dirty = False
+
+    def _stop(self):
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            # aspell exited before reading all of its input
+            pass
+        self.proc.wait()
+        self.proc = None
+
+    def __enter__(self):
+        self._start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.proc is None:
+            return
+        if exc_type is not None:
+            # aspell may be blocked writing replies that nobody reads
+            # anymore, so do not wait for it to finish
+            self.proc.kill()
+        self._stop()
+
+    def start_file(self):
+        """prepare the session for the lines of another file"""
+        if self.filter_mode and self.dirty:
+            # aspell's filters keep their state from one line to the next
+            # (e.g. an open TeX environment), so a file with unbalanced
+            # markup would affect the next one. Hence, every file gets
+            # its own aspell in that case.
+            self._stop()
+
+    def _next_report(self, reports):
+        mistakes = next(reports, None)
+        if mistakes is None:
+            # aspell stopped before replying to all lines, e.g. because
+            # the dictionary for the given --lang is missing
+            raise BackendError(f'aspell exited unexpectedly with status {self.proc.wait()}')
+        return mistakes
+
+    def check(self, lines):
+        """
+        Given the lines of a file, yield the spelling mistakes
+        including suggestions
+        """
+        if self.proc is None:
+            self._start()
+        line2mistakes = {}
+        if self.filter_mode:
+            # the result of a line may depend on the lines before it,
+            # so every line is sent to aspell in order
+            pending = lines
+        else:
+            # Identical lines (empty lines, repeated boilerplate, ...) are
+            # sent to aspell only once and their result is reused for
+            # every occurrence
+            pending = []
+            for l in dict.fromkeys(lines):
+                if l in self.cache:
+                    self.cache.move_to_end(l)
+                    line2mistakes[l] = self.cache[l]
+                elif not LETTER_RE.search(l):
+                    # lines without any letter (empty lines, numbers, ...)
+                    # cannot contain spelling mistakes
+                    line2mistakes[l] = []
+                else:
+                    pending.append(l)
+        # feed aspell from a separate thread, such that we can parse its
+        # output while it is still working on the remaining lines
+        feeder = threading.Thread(target=_aspell_feed, args=(self.proc.stdin, pending))
+        feeder.start()
+        self.dirty = True
+        reports = aspell_parse_reports(self.proc.stdout)
+        received = 0
+        try:
+            for line_number, l in enumerate(lines):
+                if self.filter_mode:
+                    mistakes = self._next_report(reports)
+                    received += 1
+                elif l in line2mistakes:
+                    mistakes = line2mistakes[l]
+                else:
+                    # the reports arrive in the order of the first occurrences
+                    mistakes = line2mistakes[l] = self.cache[l] = self._next_report(reports)
+                    received += 1
+                    if len(self.cache) > self.CACHE_SIZE:
+                        self.cache.popitem(last=False)
+                for mistake in mistakes:
+                    suggestions = mistake.suggestions if self.suggest else []
+                    yield Mistake(mistake.word, mistake.offset,
+                                  suggestions, line_number)
+        finally:
+            stopped_early = received < len(pending)
+            if stopped_early:
+                # the caller is not interested in the remaining lines
+                # (e.g. --quick after the first mistake), so stop aspell
+                # instead of waiting for all of its replies. The next
+                # check starts a new one.
+                self.proc.kill()
+            feeder.join()
+            if stopped_early:
+                self._stop()
 
 
 ## Backend: Languagetool
@@ -92,12 +284,7 @@ def languagetool_report_file(lines, languagetool_options):
     results and suggestions
     """
     # the accumulated line lengths. for each line, the number of characters before
-    total_line_len = 0
-    acc_line_lengths = []
-    for l in lines:
-        acc_line_lengths.append(total_line_len)
-        total_line_len += len(l) + len('\n')
-    acc_line_lengths.append(total_line_len)
+    acc_line_lengths = [0, *itertools.accumulate(len(l) + len('\n') for l in lines)]
 
     # run language tool
     full_input_buf = '\n'.join(lines)
@@ -123,134 +310,263 @@ def languagetool_report_file(lines, languagetool_options):
         # overwrite 'out' again
         out = '\n'.join(json_lines)
     lt_result = json.loads(out)
-    print(f'number of matches = {len(lt_result["matches"])}')
+    # to stderr, such that it does not get mixed into the output of the files
+    print(f'number of matches = {len(lt_result["matches"])}', file=sys.stderr)
     for m in lt_result['matches']:
         offset = m['offset']
         length = m['length']
-        line = bisect.bisect_left(acc_line_lengths, offset),
-        # the returned value is something like (1,)
-        line = line[0]
-        mistake = {
-          'line': line - 1,
-          'offset': offset - acc_line_lengths[line - 1],
-          'word': full_input_buf[offset : offset + length],
-          'suggestions': [],
-        }
+        # the last line starting at or before the offset
+        line = bisect.bisect_right(acc_line_lengths, offset) - 1
+        mistake = Mistake(full_input_buf[offset : offset + length],
+                          offset - acc_line_lengths[line],
+                          [],
+                          line)
         # print(mistake)
         yield mistake
 
 
-def strip_color_escapes(string):
-    """strip all color escape sequences from the given string"""
-    return re.sub('\033\\[[^m]*m', '', string)
+class LanguagetoolSession:
+    """
+    languagetool has no pipe mode, so a fresh languagetool
+    process is started for every file.
+    """
+    def __init__(self, languagetool_options, suggest=True):
+        self.languagetool_options = languagetool_options
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def start_file(self):
+        pass
 
+    def check(self, lines):
+        return languagetool_report_file(lines, self.languagetool_options)
 
-def pretty_print_mistake(lines, mistake, filename):
-    """Print the given spelling mistake dict, given the filename
-    and all the lines of the file.
+
+COLOR_GREEN = '\033[32m'
+COLOR_CYAN = '\033[36m'
+COLOR_YELLOW = '\033[33m'
+COLOR_BOLD_RED = '\033[1;31m'
+COLOR_RESET = '\033[0m'
+
+
+# the layout of the suggestions in the list output
+SUGG_WIDTH = 80
+SUGG_PREFIX = '  Suggestions: '
+SUGG_LINE_BREAK = ',\n' + ' ' * len(SUGG_PREFIX)
+
+
+def pretty_print_mistake(lines, mistake, filename, out):
+    """Print the given spelling mistake to the stream 'out',
+    given the filename and all the lines of the file.
     """
-    prefix = '\033[32m{}\033[36m:\033[33m{}\033[36m:\033[0m' \
-             .format(filename, mistake['line'])
-    indent = len(strip_color_escapes(prefix)) + mistake['offset']
-    l = lines[mistake['line']]
-    print(prefix + l[0:mistake['offset']] +
-          '\033[1;31m' +
-          l[mistake['offset']:mistake['offset'] + len(mistake['word'])] +
-          '\033[0m' + l[mistake['offset'] + len(mistake['word']):])
-    print(' ' * indent + '\033[1;31m' + '~' * len(mistake['word']) + '\033[0m')
-
-    if not mistake['suggestions']:
-        return
-    sugg_width = 80
-    sugg_prefix = '  Suggestions: '
-    sugg_cur_width = len(sugg_prefix)
-    is_first = True
-    print(sugg_prefix, end='')
-    for s in mistake['suggestions']:
-        if sugg_cur_width + 2 + len(s) > sugg_width and not is_first:
-            print(',\n' + ' ' * len(sugg_prefix), end='')
-            sugg_cur_width = len(sugg_prefix)
-        elif not is_first:
-            print(', ', end='')
-            sugg_cur_width += 2
-        is_first = False
-        print(s, end='')
-        sugg_cur_width += len(s)
-    print('\n')
-
-
-def output_mistake_list(lines, file_name, mistakes):
+    prefix = f"{COLOR_GREEN}{filename}{COLOR_CYAN}:{COLOR_YELLOW}{mistake.line}{COLOR_CYAN}:{COLOR_RESET}"
+    offset = mistake.offset
+    end = offset + len(mistake.word)
+    # the visible part of the prefix is just 'filename:line:'
+    indent = len(filename) + len(str(mistake.line)) + 2 + offset
+    l = lines[mistake.line]
+    # collect everything and write it at once instead of many print() calls
+    output = [
+        prefix, l[0:offset], COLOR_BOLD_RED, l[offset:end], COLOR_RESET, l[end:], '\n',
+        ' ' * indent, COLOR_BOLD_RED, '~' * len(mistake.word), COLOR_RESET, '\n',
+    ]
+
+    if mistake.suggestions:
+        sugg_cur_width = len(SUGG_PREFIX)
+        is_first = True
+        output.append(SUGG_PREFIX)
+        for s in mistake.suggestions:
+            if sugg_cur_width + 2 + len(s) > SUGG_WIDTH and not is_first:
+                output.append(SUGG_LINE_BREAK)
+                sugg_cur_width = len(SUGG_PREFIX)
+            elif not is_first:
+                output.append(', ')
+                sugg_cur_width += 2
+            is_first = False
+            output.append(s)
+            sugg_cur_width += len(s)
+        output.append('\n\n')
+    out.write(''.join(output))
+
+
+def output_mistake_list(lines, file_name, mistakes, out):
+    """print the mistakes one by one and return their number"""
+    # print the mistakes while the backend is still looking for more
+    count = 0
     for report_item in mistakes:
-        pretty_print_mistake(lines, report_item, file_name)
+        pretty_print_mistake(lines, report_item, file_name, out)
+        count += 1
+    return count
+
 
+def output_nothing(lines, file_name, mistakes, out):
+    """print nothing and only return whether there is any mistake (so 0 or 1).
+    The backend may still finish checking the rest of the file."""
+    return 1 if any(True for _ in mistakes) else 0
 
-def output_augmented_input(lines, file_name, mistakes):
-    line2mistakes = {}
+
+def output_augmented_input(lines, file_name, mistakes, out):
+    """print the input with the mistakes highlighted and return their number"""
+    count = 0
+    line2mistakes = defaultdict(list)
     for report_item in mistakes:
-        n = report_item['line']
-        mistakes = line2mistakes.get(n, [])
-        mistakes.append(report_item)
-        line2mistakes[n] = mistakes
+        line2mistakes[report_item.line].append(report_item)
+        count += 1
     for n, l in enumerate(lines):
         # if there are no mistakes in this line
         # then just print it
         if n not in line2mistakes:
-            print(l)
+            out.write(l + '\n')
             continue
         # if there are mistakes in this line, then highlight them
-        mistakes = line2mistakes.get(n, [])
-        offset2mistake = {}
-        for m in mistakes:
-            offset2mistake[m['offset']] = m
-        output = ""
-        endoffset = -1
-        for offset, ch in enumerate(l + '\n'):
-            if offset == endoffset:
-                output += '\033[0m'
-                endoffset = -1
-            if offset in offset2mistake:
-                mistake = offset2mistake[offset]
-                endoffset = offset + len(mistake['word'])
-                output += '\033[1;31m'
-            output += str(ch)
-        print(output, end='')
+        # the (start, end) offsets of the mistakes, ordered by their start
+        spans = sorted((m.offset, m.offset + len(m.word))
+                       for m in line2mistakes[n])
+        # highlight the mistakes span-wise instead of character by character
+        output = []
+        endoffset = 0
+        for offset, end in spans:
+            if offset < endoffset:
+                # skip mistakes overlapping the previous one
+                continue
+            output.append(l[endoffset:offset])
+            output.append(COLOR_BOLD_RED)
+            output.append(l[offset:end])
+            output.append(COLOR_RESET)
+            endoffset = end
+        output.append(l[endoffset:])
+        output.append('\n')
+        out.write(''.join(output))
+    return count
 
 
 AVAILABLE_BACKENDS = {
-    'aspell': aspell_report_file,
-    'languagetool': languagetool_report_file,
-    'lt': languagetool_report_file,
+    'aspell': AspellSession,
+    'languagetool': LanguagetoolSession,
+    'lt': LanguagetoolSession,
 }
 
 
-def check_file(file_handle, file_name, parsed_args, output_function):
-    """check the given file and return the number of mistakes found"""
-    lines = file_handle.readlines()
-    lines = [l.rstrip('\n\r') for l in lines]
-    global AVAILABLE_BACKENDS
-    callback = AVAILABLE_BACKENDS[parsed_args.backend]
-    mistakes = list(callback(lines, parsed_args.backendarg))
-    output_function(lines, file_name, mistakes)
-    return len(mistakes)
+OUTPUT_MODES = {
+    'augmented': output_augmented_input,
+    'list': output_mistake_list,
+}
 
 
-def main():
-    """The main."""
-    global AVAILABLE_BACKENDS
+@contextlib.contextmanager
+def open_input_file(filename):
+    """open the given file for reading its text.
+    PDF files are converted to text by pdftotext.
+    """
+    if filename.lower().endswith('.pdf'):
+        pdf2text_cmd = ['pdftotext', '-layout', '-nopgbrk', filename, '-']
+        pdfproc = subprocess.Popen(pdf2text_cmd, stdout=subprocess.PIPE, universal_newlines=True)
+        try:
+            yield pdfproc.stdout
+        finally:
+            pdfproc.terminate()
+            pdfproc.wait()
+    else:
+        with open(filename, 'r') as file_handle:
+            yield file_handle
+
+
+def read_input_file(filename):
+    """return the text of the given file"""
+    with open_input_file(filename) as file_handle:
+        return file_handle.read()
+
+
+def read_input_files(filenames, prefetch=8):
+    """yield the tuple (filename, text) for each of the given files.
+    Up to 'prefetch' files are read ahead in a background thread, such
+    that reading them overlaps with checking the current one.
+    """
+    # a single thread reads the files one after the other, such that at
+    # most one read is still running if the caller stops early
+    reader = ThreadPoolExecutor(max_workers=1)
+    pending = deque()
+    try:
+        for filename in filenames:
+            pending.append((filename, reader.submit(read_input_file, filename)))
+            if len(pending) > prefetch:
+                filename, future = pending.popleft()
+                yield filename, future.result()
+        while pending:
+            filename, future = pending.popleft()
+            yield filename, future.result()
+    finally:
+        # if the caller stopped early (e.g. --quick), drop the files that
+        # are not read yet instead of waiting for them
+        reader.shutdown(wait=False, cancel_futures=True)
+
+
+def check_file(text, file_name, session, output_function, out):
+    """check the given text of a file with the given backend session, write
+    the result to the stream 'out' and return the number of mistakes found"""
+    # all inputs are read with universal newlines, so lines are separated
+    # by '\n' only. str.splitlines() would also split at form feeds etc.
+    lines = text.split('\n')
+    if lines[-1] == '':
+        # a final line break does not start another line
+        lines.pop()
+    # close the generator right away if the output function fails, such
+    # that the session is in a clean state again
+    with contextlib.closing(session.check(lines)) as mistakes:
+        return output_function(lines, file_name, mistakes, out)
+
+
+# the backend session of a process in the process pool
+worker_session = None
+
+
+def init_worker(backend, backend_options, suggest):
+    """start the backend session of a process in the process pool"""
+    global worker_session
+    # the session is never closed explicitly: when the worker process
+    # exits, the spell checker's stdin is closed and it terminates, too.
+    worker_session = AVAILABLE_BACKENDS[backend](backend_options, suggest).__enter__()
+
+
+def check_file_worker(filename, output_function):
+    """check the given file in a process of the process pool and
+    return the tuple (filename, formatted output, number of mistakes)
+    """
+    out = io.StringIO()
+    # which files a worker gets depends on the scheduling, so in filter
+    # modes each file must not depend on the worker's previous ones
+    worker_session.start_file()
+    count = check_file(read_input_file(filename), filename, worker_session,
+                       output_function, out)
+    return filename, out.getvalue(), count
+
+
+# the --help epilog, already written without indentation
+EPILOG = """\
+EXAMPLE:
+  - Check a pdf file
+    {progname} --files some.pdf -- --lang=en_US
+  - Check all tex files in the current directory with british-ize:
+    {progname} --files *.tex -- -t --lang=en_GB --variety ize
+  - Use an aspell wordlist:
+    {progname} --files *.tex -- -t --lang=en_GB --variety ize -p ./wordlist.txt
+    where wordlist.txt is a file starting with "personal_ws-1.1 en 1 "
+    followed by all words in the wordlist.
+"""
+
+
+def build_parser():
+    """build the parser for the command line arguments"""
+    # argparse is only needed when run from the command line
+    import argparse
     default_backend = 'aspell'
     assert default_backend in AVAILABLE_BACKENDS
     desc = 'Non-interactive spell checking a beautified output'
-    epilog = textwrap.dedent("""\
-    EXAMPLE:
-      - Check a pdf file
-        {progname} --files some.pdf -- --lang=en_US
-      - Check all tex files in the current directory with british-ize:
-        {progname} --files *.tex -- -t --lang=en_GB --variety ize
-      - Use an aspell wordlist:
-        {progname} --files *.tex -- -t --lang=en_GB --variety ize -p ./wordlist.txt
-        where wordlist.txt is a file starting with "personal_ws-1.1 en 1 "
-        followed by all words in the wordlist.
-    """.format(progname=sys.argv[0]))
+    epilog = EPILOG.format(progname=sys.argv[0])
     parser = argparse.ArgumentParser(
         description=desc,
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -266,32 +582,83 @@ def main():
 
     parser.add_argument('--exit-code', dest='exit_code', default=False, action='store_true',
                         help='Exit code is failure is only 0 if there are not spelling mistakes')
-    output_modes = {
-        'augmented': output_augmented_input,
-        'list': output_mistake_list,
-    }
+    parser.add_argument('--quick', default=False, action='store_true',
+                        help='Together with --exit-code: print nothing and skip the remaining files once a spelling mistake is found')
     parser.add_argument('--output-mode', dest='output_mode',
-                        choices=output_modes.keys(),
+                        choices=OUTPUT_MODES.keys(),
                         help='Style of output', default='augmented')
-    args = parser.parse_args()
+    parser.add_argument('--no-suggest', dest='suggest', default=True, action='store_false',
+                        help='Do not compute and show suggestions for the spelling mistakes')
+    # more processes rarely pay off, as each of them starts its own spell checker
+    default_jobs = min(os.cpu_count() or 1, 16)
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs,
+                        help=f'Number of files to check in parallel (default: {default_jobs})')
+    return parser
+
+
+def check_files(args, output_function, suggest, quick):
+    """check the input files given by the command line arguments 'args'
+    and return the number of mistakes found"""
     files = args.files
     count = 0
-    output_function = output_modes[args.output_mode]
-    if files is None or files == []:
-        count += check_file(sys.stdin, '<stdin>', args, output_function)
+    backend = AVAILABLE_BACKENDS[args.backend]
+    if files and len(files) > 1 and args.jobs > 1:
+        # every process of the pool has its own backend session
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(files)),
+                                 initializer=init_worker,
+                                 initargs=(args.backend, args.backendarg, suggest)) as executor:
+            jobs = [executor.submit(check_file_worker, filename, output_function)
+                    for filename in files]
+            # the outputs are printed in the order of the files given
+            for job in jobs:
+                _, output, file_count = job.result()
+                sys.stdout.write(output)
+                count += file_count
+                if quick and count > 0:
+                    # skip the files not started yet, the running ones
+                    # are awaited when leaving the 'with' block
+                    for pending_job in jobs:
+                        pending_job.cancel()
+                    break
     else:
-        for filename in files:
-            if re.match(r'.*\.pdf$', filename):
-                pdf2text_cmd = ['pdftotext', '-layout', '-nopgbrk', filename, '-']
-                pdfproc = subprocess.Popen(pdf2text_cmd, stdout=subprocess.PIPE, universal_newlines=True)
-                count += check_file(pdfproc.stdout, filename, args, output_function)
-                pdfproc.terminate()
-                pdfproc.wait()
+        # a single backend session is used for all files
+        with backend(args.backendarg, suggest) as session:
+            if files is None or files == []:
+                # sys.stdin does not translate '\r\n' by default
+                sys.stdin.reconfigure(newline=None)
+                count += check_file(sys.stdin.read(), '<stdin>', session,
+                                    output_function, sys.stdout)
             else:
-                with open(filename, 'r') as file_handle:
-                    count += check_file(file_handle, filename, args, output_function)
+                with contextlib.closing(read_input_files(files)) as texts:
+                    for filename, text in texts:
+                        session.start_file()
+                        count += check_file(text, filename, session,
+                                            output_function, sys.stdout)
+                        if quick and count > 0:
+                            break
+    return count
+
+
+def main():
+    """The main."""
+    args = build_parser().parse_args()
+    output_function = OUTPUT_MODES[args.output_mode]
+    # only the list output shows the suggestions
+    suggest = args.suggest and args.output_mode == 'list'
+    quick = args.quick and args.exit_code
+    if quick:
+        # only the exit code matters
+        output_function = output_nothing
+        suggest = False
+    try:
+        count = check_files(args, output_function, suggest, quick)
+    except BackendError as e:
+        print(f'{os.path.basename(sys.argv[0])}: {e}', file=sys.stderr)
+        return 2
     if count > 0 and args.exit_code:
         return 1
     return 0
 
-sys.exit(main())
+
+if __name__ == '__main__':
+    sys.exit(main())